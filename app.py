@@ -23,6 +23,9 @@ def add_cache_headers(response):
 # Initialize the spam classifier
 classifier = None
 
+# Maximum number of texts accepted by /api/classify/batch
+MAX_BATCH_SIZE = 1000
+
 def initialize_classifier():
     """Initialize the spam classifier"""
     global classifier
@@ -109,6 +112,56 @@ def classify_email():
             'error': f'Classification failed: {str(e)}'
         }), 500
 
+@app.route('/api/classify/batch', methods=['POST'])
+def classify_batch():
+    """Classify a list of email texts in one request"""
+    try:
+        data = request.get_json()
+
+        if not isinstance(data, dict) or not isinstance(data.get('texts'), list):
+            return jsonify({
+                'error': 'No texts provided'
+            }), 400
+
+        if len(data['texts']) > MAX_BATCH_SIZE:
+            return jsonify({
+                'error': f'Too many texts (maximum {MAX_BATCH_SIZE})'
+            }), 400
+
+        texts = [text.strip() for text in data['texts'] if isinstance(text, str)]
+
+        if len(texts) != len(data['texts']) or not all(texts):
+            return jsonify({
+                'error': 'Empty or invalid text provided'
+            }), 400
+
+        if classifier is None or not classifier.is_trained:
+            return jsonify({
+                'error': 'Model not loaded'
+            }), 500
+
+        results = classifier.predict_batch(texts)
+
+        return jsonify({
+            'success': True,
+            'results': [
+                {
+                    'text': text,
+                    'prediction': result['prediction'],
+                    'confidence': result['confidence'],
+                    'spam_probability': result['spam_probability'],
+                    'ham_probability': result['ham_probability'],
+                    'features': result['features']
+                }
+                for text, result in zip(texts, results)
+            ]
+        })
+
+    except Exception as e:
+        return jsonify({
+            'error': f'Classification failed: {str(e)}'
+        }), 500
+
 @app.route('/api/train', methods=['POST'])
 def train_model():
     """Retrain the model with new data"""
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the sharded coordinator.
+
+Measures messages per second for the in-process classifier and for a
+coordinator with an increasing number of local workers, on both the batch
+path (/api/classify/batch) and the single-message path (/api/classify,
+driven by concurrent client threads). Also reports the coordinator's own
+CPU time per message, which caps how far one coordinator can scale.
+
+Usage:
+    python benchmark.py --workers 1 2 4 8 --threads 16 --messages 20000
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from coordinator import ShardCoordinator
+from spam_classifier import SpamClassifier, SAMPLE_DATA
+
+
+def make_messages(count):
+    """Distinct messages, so worker caches do not flatter the numbers"""
+    texts = SAMPLE_DATA['texts']
+    return [f"{texts[i % len(texts)]} ref {i}" for i in range(count)]
+
+
+def run_threads(threads, target, messages):
+    """Split messages across client threads; return (seconds, coordinator CPU seconds)"""
+    chunks = [messages[i::threads] for i in range(threads)]
+    workers = [threading.Thread(target=target, args=(chunk,)) for chunk in chunks]
+    wall, cpu = time.perf_counter(), time.process_time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - wall, time.process_time() - cpu
+
+
+def report(label, count, seconds, cpu):
+    print(f"{label:<32} {count / seconds:>10,.0f} msg/s "
+          f"{cpu / count * 1e6:>8.1f} µs coordinator CPU/msg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sharded coordinator")
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument('--threads', type=int, default=16,
+                        help="Concurrent client threads")
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    print(f"CPUs: {os.cpu_count()}, messages: {args.messages}, "
+          f"client threads: {args.threads}")
+    print("=" * 72)
+
+    classifier = SpamClassifier()
+    start = time.perf_counter()
+    classifier.predict_batch(messages)
+    seconds = time.perf_counter() - start
+    report("in-process", len(messages), seconds, seconds)
+
+    for count in args.workers:
+        with ShardCoordinator() as coordinator:
+            coordinator.spawn_local(count, cache_size=0)
+            coordinator.predict_batch(messages[:100])
+
+            def batches(chunk):
+                for i in range(0, len(chunk), args.batch_size):
+                    coordinator.predict_batch(chunk[i:i + args.batch_size])
+
+            def singles(chunk):
+                for text in chunk:
+                    coordinator.predict(text)
+
+            seconds, cpu = run_threads(args.threads, batches, messages)
+            report(f"{count} workers, batch", len(messages), seconds, cpu)
+            seconds, cpu = run_threads(args.threads, singles, messages)
+            report(f"{count} workers, single", len(messages), seconds, cpu)
+            seconds, cpu = run_threads(1, singles, messages[:2000])
+            report(f"{count} workers, single, 1 client", 2000, seconds, cpu)
+
+
+if __name__ == '__main__':
+    main()
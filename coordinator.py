@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+"""
+Sharded scoring coordinator for the spam classifier.
+
+Runs N classifier workers (local processes or workers on other hosts) and
+routes every message to a worker by consistent hashing of its normalized
+content, so repeated campaigns keep hitting the same worker's cache.
+Batches are split per shard, scored in parallel and reassembled in order.
+When a worker stops answering it is taken off the ring, its messages fail
+over to the next worker on the ring, and it rejoins once it answers again.
+"""
+
+import argparse
+import bisect
+import hashlib
+import multiprocessing
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import (Connection, Listener, answer_challenge,
+                                        deliver_challenge)
+
+from spam_classifier import SpamClassifier
+
+DEFAULT_MODEL_PATH = 'models/spam_classifier.joblib'
+DEFAULT_REPLICAS = 100
+DEFAULT_CACHE_SIZE = 10000
+WORKER_START_TIMEOUT = 30
+DEFAULT_TIMEOUT = 10
+DEFAULT_PROBE_INTERVAL = 5
+MAX_COALESCED = 1000
+
+
+class WorkerUnavailable(Exception):
+    """Raised when a worker cannot be reached or no workers are left"""
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, nodes=(), replicas=DEFAULT_REPLICAS):
+        self.replicas = replicas
+        self._keys = []
+        self._owners = {}
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def hash_key(key):
+        """Return the ring position of key"""
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+    def add(self, node):
+        """Add a node and its virtual replicas to the ring"""
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.replicas):
+            point = self.hash_key(f"{node}#{i}")
+            if point in self._owners:
+                continue
+            self._owners[point] = node
+            bisect.insort(self._keys, point)
+
+    def remove(self, node):
+        """Remove a node and its virtual replicas from the ring"""
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        for i in range(self.replicas):
+            point = self.hash_key(f"{node}#{i}")
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                index = bisect.bisect_left(self._keys, point)
+                if index < len(self._keys) and self._keys[index] == point:
+                    del self._keys[index]
+
+    def get_node(self, key):
+        """Return the node owning key, or None if the ring is empty"""
+        return self.lookup(self.hash_key(key))
+
+    def lookup(self, point):
+        """Return the node owning ring position point, or None if the ring is empty"""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, point) % len(self._keys)
+        return self._owners[self._keys[index]]
+
+
+def serve_worker(address, authkey, model_path=DEFAULT_MODEL_PATH,
+                 cache_size=DEFAULT_CACHE_SIZE, ready=None):
+    """Run a classifier worker that answers requests on address"""
+    classifier = SpamClassifier()
+    if model_path and os.path.exists(model_path):
+        classifier.load_model(model_path)
+
+    # The keyword scan only depends on the normalized text, so variants of a
+    # campaign routed here share it; raw-text features are computed per call.
+    classifier.count_keywords = lru_cache(maxsize=cache_size)(classifier.count_keywords)
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if op == 'predict_batch':
+                        # The coordinator already normalized the texts to route them
+                        texts, processed_texts = payload
+                        result = classifier.predict_batch(texts, processed_texts)
+                    elif op == 'ping':
+                        info = classifier.count_keywords.cache_info()
+                        result = {
+                            'pid': os.getpid(),
+                            'cache_hits': info.hits,
+                            'cache_misses': info.misses,
+                            'cache_size': info.currsize
+                        }
+                    else:
+                        raise ValueError(f"Unknown operation: {op}")
+                    conn.send(('ok', result))
+                except Exception as e:
+                    conn.send(('error', str(e)))
+
+    with Listener(address, authkey=authkey) as listener:
+        if ready is not None:
+            ready.send(listener.address)
+            ready.close()
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, OSError):
+                # Failed handshake (e.g. wrong authkey); keep serving
+                continue
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+
+class WorkerClient:
+    """Connection from the coordinator to a single worker"""
+
+    def __init__(self, address, authkey, process=None, name=None,
+                 timeout=DEFAULT_TIMEOUT):
+        self.address = tuple(address)
+        self.name = name or f"{self.address[0]}:{self.address[1]}"
+        self.authkey = authkey
+        self.process = process
+        self.timeout = timeout
+        self._conn = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._submit_lock = threading.Lock()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, texts, processed_texts):
+        """Queue texts for scoring; returns a Future with their results"""
+        future = Future()
+        with self._submit_lock:
+            if self._closed:
+                future.set_exception(WorkerUnavailable(f"Worker {self.name} was closed"))
+            else:
+                self._queue.put((texts, processed_texts, future))
+        return future
+
+    def _dispatch(self):
+        """Send queued work to the worker, one round trip at a time.
+
+        Everything that queues up while a round trip is in flight goes out
+        together in the next one, so concurrent single-message requests
+        share the IPC cost instead of paying it each.
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._fail_queued(WorkerUnavailable(f"Worker {self.name} was closed"))
+                return
+            items = [item]
+            size = len(item[0])
+            while size < MAX_COALESCED:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                items.append(item)
+                size += len(item[0])
+
+            texts = [text for item in items for text in item[0]]
+            processed_texts = [text for item in items for text in item[1]]
+            try:
+                results = self.call('predict_batch', (texts, processed_texts))
+            except Exception as e:
+                for _, _, future in items:
+                    future.set_exception(e)
+                if isinstance(e, WorkerUnavailable):
+                    self._fail_queued(e)
+                continue
+            start = 0
+            for item_texts, _, future in items:
+                future.set_result(results[start:start + len(item_texts)])
+                start += len(item_texts)
+
+    def _fail_queued(self, error):
+        """Fail work queued behind a round trip to an unavailable worker"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is None:
+                self._queue.put(None)
+                return
+            item[2].set_exception(error)
+
+    def call(self, op, payload=None):
+        """Send a request and wait for its reply.
+
+        The whole call, including waiting for the connection lock, connecting
+        and the auth handshake, is bounded by timeout. A dropped connection
+        is retried once on a fresh connection; a timeout is not retried.
+        """
+        deadline = time.monotonic() + self.timeout
+        if not self._lock.acquire(timeout=self.timeout):
+            raise WorkerUnavailable(f"Worker {self.name} unavailable: busy for {self.timeout}s")
+        try:
+            for attempt in range(2):
+                try:
+                    status, result = self._request(op, payload, deadline)
+                    break
+                except (TimeoutError, BlockingIOError) as e:
+                    # A reply may still arrive later, so the connection is unusable
+                    self._close_conn()
+                    raise WorkerUnavailable(f"Worker {self.name} unavailable: {e}")
+                except (EOFError, OSError) as e:
+                    self._close_conn()
+                    if attempt:
+                        raise WorkerUnavailable(f"Worker {self.name} unavailable: {e}")
+        finally:
+            self._lock.release()
+        if status != 'ok':
+            raise RuntimeError(f"Worker {self.name} failed: {result}")
+        return result
+
+    def _request(self, op, payload, deadline):
+        if self._conn is None:
+            self._conn = self._connect(deadline)
+        self._conn.send((op, payload))
+        if not self._conn.poll(max(deadline - time.monotonic(), 0)):
+            raise TimeoutError(f"no reply within {self.timeout}s")
+        return self._conn.recv()
+
+    def _connect(self, deadline):
+        """Open an authenticated connection, giving up at deadline.
+
+        multiprocessing's Client() has no timeout for the connect or the
+        handshake, so the socket is set up here with kernel send/receive
+        timeouts that bound every blocking read and write on it.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0.001:
+            raise TimeoutError(f"no reply within {self.timeout}s")
+        sock = socket.create_connection(self.address, timeout=remaining)
+        sock.setblocking(True)
+        seconds = int(remaining)
+        timeval = struct.pack('ll', seconds, int((remaining - seconds) * 1e6))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, timeval)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, timeval)
+        conn = Connection(sock.detach())
+        try:
+            answer_challenge(conn, self.authkey)
+            deliver_challenge(conn, self.authkey)
+        except AuthenticationError:
+            conn.close()
+            raise WorkerUnavailable(
+                f"Worker {self.name} rejected the connection: "
+                "SPAM_WORKER_AUTHKEY does not match")
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def replace_process(self, address, process):
+        """Point this client at a respawned worker process"""
+        with self._lock:
+            self._close_conn()
+            self.address = tuple(address)
+            self.process = process
+
+    def close_connection(self):
+        """Close the connection; the next call opens a new one"""
+        with self._lock:
+            self._close_conn()
+
+    def _close_conn(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except OSError:
+                pass
+            self._conn = None
+
+    def stop_process(self):
+        """Stop the worker process if we own it"""
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=5)
+
+    def close(self):
+        """Close the connection and stop the worker process if we own it"""
+        with self._submit_lock:
+            self._closed = True
+            self._queue.put(None)
+        self.close_connection()
+        self.stop_process()
+
+
+class ShardCoordinator:
+    """Routes classification requests across a set of workers.
+
+    Implements the predict, predict_batch, train and is_trained members
+    that app.py uses, so it can stand in for SpamClassifier there. Workers that stop
+    answering are taken off the ring and probed in the background until
+    they answer again; dead local worker processes are respawned.
+    """
+
+    def __init__(self, authkey=None, replicas=DEFAULT_REPLICAS, max_threads=32,
+                 timeout=DEFAULT_TIMEOUT, probe_interval=DEFAULT_PROBE_INTERVAL):
+        self.authkey = authkey or os.urandom(16)
+        self.timeout = timeout
+        self.ring = HashRing(replicas=replicas)
+        self.workers = {}
+        self.down = {}
+        self._spawn_args = {}
+        self._local_count = 0
+        self._normalizer = SpamClassifier()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_threads)
+        self._stopped = threading.Event()
+        self._prober = threading.Thread(
+            target=self._probe_loop, args=(probe_interval,), daemon=True)
+        self._prober.start()
+
+    @property
+    def is_trained(self):
+        return bool(self.ring.nodes)
+
+    def _start_processes(self, count, model_path, cache_size, host):
+        """Start worker processes and wait for their addresses"""
+        # Respawns happen while request and probe threads are running, and
+        # forking a multi-threaded process can deadlock the child
+        ctx = multiprocessing.get_context('spawn')
+        started = []
+        try:
+            for _ in range(count):
+                reader, writer = ctx.Pipe(duplex=False)
+                process = ctx.Process(
+                    target=serve_worker,
+                    args=((host, 0), self.authkey, model_path, cache_size, writer),
+                    daemon=True
+                )
+                process.start()
+                writer.close()
+                started.append((reader, process))
+
+            addresses = []
+            for reader, process in started:
+                if not reader.poll(WORKER_START_TIMEOUT):
+                    raise WorkerUnavailable("Worker process failed to start")
+                addresses.append((reader.recv(), process))
+            return addresses
+        except BaseException:
+            for _, process in started:
+                if process.is_alive():
+                    process.terminate()
+                process.join(timeout=5)
+            raise
+        finally:
+            for reader, _ in started:
+                reader.close()
+
+    def spawn_local(self, count, model_path=DEFAULT_MODEL_PATH,
+                    cache_size=DEFAULT_CACHE_SIZE, host='127.0.0.1'):
+        """Start count worker processes on this host and add them to the ring.
+
+        Local workers get stable names, so a respawned worker takes back
+        the same slice of the ring on its new port.
+        """
+        spawn_args = (model_path, cache_size, host)
+        workers = []
+        for address, process in self._start_processes(count, *spawn_args):
+            self._local_count += 1
+            name = f"local-{self._local_count}"
+            self._spawn_args[name] = spawn_args
+            workers.append(self.add_worker(address, process=process, name=name))
+        return workers
+
+    def add_worker(self, address, process=None, name=None):
+        """Add a worker listening on address (host, port) to the ring"""
+        worker = WorkerClient(address, self.authkey, process=process,
+                              name=name, timeout=self.timeout)
+        with self._lock:
+            self.workers[worker.name] = worker
+            self.ring.add(worker.name)
+        return worker
+
+    def remove_worker(self, name):
+        """Drop a worker from the ring and close it"""
+        with self._lock:
+            self.ring.remove(name)
+            worker = self.workers.pop(name, None) or self.down.pop(name, None)
+            self._spawn_args.pop(name, None)
+        if worker is not None:
+            worker.close()
+
+    def mark_down(self, name):
+        """Take a worker off the ring until a probe finds it answering again"""
+        with self._lock:
+            self.ring.remove(name)
+            worker = self.workers.pop(name, None)
+            if worker is not None:
+                self.down[name] = worker
+
+    def probe(self):
+        """Ping down workers, respawning dead local ones, and re-add the live ones.
+
+        Workers are probed in parallel, so one hung host cannot hold up the rest.
+        """
+        with self._lock:
+            down = list(self.down.values())
+        for future in [self._executor.submit(self._probe_worker, w) for w in down]:
+            future.result()
+
+    def _probe_worker(self, worker):
+        spawn_args = self._spawn_args.get(worker.name)
+        if worker.process is not None and not worker.process.is_alive() and spawn_args:
+            try:
+                [(address, process)] = self._start_processes(1, *spawn_args)
+            except WorkerUnavailable:
+                return
+            worker.replace_process(address, process)
+        try:
+            worker.call('ping')
+        except (WorkerUnavailable, RuntimeError):
+            return
+        with self._lock:
+            if self.down.pop(worker.name, None) is worker:
+                self.workers[worker.name] = worker
+                self.ring.add(worker.name)
+
+    def _probe_loop(self, interval):
+        while not self._stopped.wait(interval):
+            self.probe()
+
+    def route(self, text):
+        """Return the name of the worker responsible for text"""
+        point = HashRing.hash_key(self._normalizer.preprocess_text(text))
+        with self._lock:
+            return self.ring.lookup(point)
+
+    def train(self, texts, labels):
+        """Placeholder for compatibility - workers are rule-based and need no training"""
+        return True
+
+    def predict(self, text):
+        """Classify a single text on its shard"""
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts):
+        """Classify texts across shards, preserving input order"""
+        results = [None] * len(texts)
+        pending = list(range(len(texts)))
+        # Normalizing and hashing is the coordinator's main per-message cost;
+        # do it once, outside the lock, and only hold the lock for lookups.
+        # Workers get the normalized text too, so they don't redo it.
+        processed_texts = [self._normalizer.preprocess_text(text) for text in texts]
+        points = [HashRing.hash_key(text) for text in processed_texts]
+
+        while pending:
+            with self._lock:
+                owners = [self.ring.lookup(points[index]) for index in pending]
+            if None in owners:
+                raise WorkerUnavailable("No live workers")
+            shards = {}
+            for index, name in zip(pending, owners):
+                shards.setdefault(name, []).append(index)
+
+            futures = {
+                name: self._submit_shard(name, indices, texts, processed_texts)
+                for name, indices in shards.items()
+            }
+
+            pending = []
+            for name, future in futures.items():
+                indices = shards[name]
+                try:
+                    shard_results = future.result()
+                except WorkerUnavailable:
+                    # Fail over: the next pass routes these to the new owners
+                    self.mark_down(name)
+                    pending.extend(indices)
+                    continue
+                for index, result in zip(indices, shard_results):
+                    results[index] = result
+            pending.sort()
+
+        return results
+
+    def _submit_shard(self, name, indices, texts, processed_texts):
+        worker = self.workers.get(name)
+        if worker is None:
+            future = Future()
+            future.set_exception(WorkerUnavailable(f"Worker {name} was removed"))
+            return future
+        return worker.submit([texts[i] for i in indices],
+                             [processed_texts[i] for i in indices])
+
+    def stats(self):
+        """Return per-worker cache statistics"""
+        stats = {}
+        for name, worker in list(self.workers.items()):
+            try:
+                stats[name] = worker.call('ping')
+            except (WorkerUnavailable, RuntimeError):
+                stats[name] = None
+        return stats
+
+    def close(self):
+        """Stop all workers owned by this coordinator"""
+        self._stopped.set()
+        for name in list(self.workers) + list(self.down):
+            self.remove_worker(name)
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parse_address(value):
+    """Parse a host:port string"""
+    host, _, port = value.rpartition(':')
+    return (host or '127.0.0.1', int(port))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded spam classifier")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    worker_parser = subparsers.add_parser('worker', help="Run a single classifier worker")
+    worker_parser.add_argument('--host', default='127.0.0.1')
+    worker_parser.add_argument('--port', type=int, default=6001)
+    worker_parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+
+    serve_parser = subparsers.add_parser('serve', help="Run the web app backed by sharded workers")
+    serve_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                              help="Number of local worker processes to start")
+    serve_parser.add_argument('--connect', action='append', default=[],
+                              metavar='HOST:PORT', help="Address of a remote worker")
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+
+    args = parser.parse_args()
+    authkey = os.environ.get('SPAM_WORKER_AUTHKEY', '').encode() or None
+
+    if args.command == 'worker':
+        if authkey is None:
+            parser.error("SPAM_WORKER_AUTHKEY must be set for standalone workers")
+        print(f"🚀 Starting classifier worker on {args.host}:{args.port}")
+        serve_worker((args.host, args.port), authkey, args.model)
+        return
+
+    if args.connect and authkey is None:
+        parser.error("SPAM_WORKER_AUTHKEY must be set to connect to remote workers")
+
+    import app
+
+    coordinator = ShardCoordinator(authkey=authkey)
+    if args.workers > 0:
+        coordinator.spawn_local(args.workers, model_path=args.model)
+    for address in args.connect:
+        worker = coordinator.add_worker(parse_address(address))
+        try:
+            worker.call('ping')
+        except (WorkerUnavailable, RuntimeError) as e:
+            coordinator.close()
+            parser.error(str(e))
+    if not coordinator.workers:
+        coordinator.close()
+        parser.error("No workers: use --workers N and/or --connect HOST:PORT")
+    app.classifier = coordinator
+
+    print(f"✅ Coordinator running with {len(coordinator.workers)} workers")
+    print(f"🌐 Starting web server on http://localhost:{args.port}")
+    try:
+        app.app.run(host=args.host, port=args.port, threaded=True)
+    finally:
+        coordinator.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -41,16 +41,18 @@ class SpamClassifier:
         
         return text
     
-    def extract_features(self, text):
+    def extract_features(self, text, processed_text=None):
         """Extract features for classification"""
-        processed_text = self.preprocess_text(text)
-        words = processed_text.split()
+        if processed_text is None:
+            processed_text = self.preprocess_text(text)
+        word_count, spam_keyword_count, ham_keyword_count = self.count_keywords(
+            processed_text)
         
         features = {
             'text_length': len(text),
-            'word_count': len(words),
-            'spam_keyword_count': 0,
-            'ham_keyword_count': 0,
+            'word_count': word_count,
+            'spam_keyword_count': spam_keyword_count,
+            'ham_keyword_count': ham_keyword_count,
             'exclamation_count': text.count('!'),
             'question_count': text.count('?'),
             'capital_count': sum(1 for c in text if c.isupper()),
@@ -59,14 +61,21 @@ class SpamClassifier:
             'email_count': len(re.findall(r'\S+@\S+', text))
         }
         
-        # Count spam and ham keywords
+        return features
+    
+    def count_keywords(self, processed_text):
+        """Count words, spam keywords and ham keywords in preprocessed text"""
+        words = processed_text.split()
+        spam_keyword_count = 0
+        ham_keyword_count = 0
+        
         for word in words:
             if word in self.spam_keywords:
-                features['spam_keyword_count'] += 1
+                spam_keyword_count += 1
             if word in self.ham_keywords:
-                features['ham_keyword_count'] += 1
+                ham_keyword_count += 1
         
-        return features
+        return len(words), spam_keyword_count, ham_keyword_count
     
     def calculate_spam_score(self, features):
         """Calculate spam probability based on features"""
@@ -88,9 +97,9 @@ class SpamClassifier:
         
         return spam_probability
     
-    def predict(self, text):
+    def predict(self, text, processed_text=None):
         """Predict if text is spam or ham"""
-        features = self.extract_features(text)
+        features = self.extract_features(text, processed_text)
         spam_probability = self.calculate_spam_score(features)
         
         # Determine prediction based on threshold
@@ -106,7 +115,14 @@ class SpamClassifier:
             'ham_probability': 1.0 - spam_probability,
             'features': features
         }
-    
+
+    def predict_batch(self, texts, processed_texts=None):
+        """Predict a list of texts, preserving input order"""
+        if processed_texts is None:
+            return [self.predict(text) for text in texts]
+        return [self.predict(text, processed)
+                for text, processed in zip(texts, processed_texts)]
+
     def train(self, texts, labels):
         """Placeholder for compatibility - rule-based doesn't need training"""
         return True
@@ -5,6 +5,11 @@ Test script for the spam classifier
 
 from spam_classifier import SpamClassifier
 import json
+import os
+import signal
+import sys
+import threading
+import time
 
 def test_classifier():
     """Test the spam classifier with various examples"""
@@ -95,6 +100,147 @@ def test_classifier():
         print("❌ The classifier needs improvement.")
         return False
 
+def test_hash_ring():
+    """Test that removing a node only moves the keys it owned"""
+    print("\n💍 Testing consistent hash ring...")
+    print("=" * 50)
+
+    from coordinator import HashRing
+
+    ring = HashRing(['a', 'b', 'c', 'd'])
+    keys = [f"message {i}" for i in range(2000)]
+    before = {key: ring.get_node(key) for key in keys}
+    assert set(before.values()) == {'a', 'b', 'c', 'd'}
+
+    ring.remove('b')
+    after = {key: ring.get_node(key) for key in keys}
+    for key in keys:
+        if before[key] == 'b':
+            assert after[key] != 'b'
+        else:
+            assert after[key] == before[key]
+
+    ring.add('b')
+    assert {key: ring.get_node(key) for key in keys} == before
+    print("✅ Only the removed node's keys moved")
+
+def test_coordinator():
+    """Test sharded scoring across local worker processes"""
+    print("\n🔀 Testing sharded coordinator...")
+    print("=" * 50)
+
+    from coordinator import ShardCoordinator
+
+    texts = [
+        "FREE MONEY! Click here to claim your $1000 prize NOW!",
+        "free money!!! click here to claim your $1000 prize now",
+        "Hi John, can we schedule a meeting for the project review?",
+        "URGENT: Your account has been suspended. Click here to verify!",
+        "Thanks for the report, I appreciate your feedback."
+    ]
+    expected = SpamClassifier().predict_batch(texts)
+
+    # Probing is driven by hand below instead of the background thread
+    with ShardCoordinator(probe_interval=3600) as coordinator:
+        coordinator.spawn_local(3)
+        assert coordinator.train(texts, [1, 1, 0, 1, 0])
+
+        # Batch results must match a single classifier, in input order
+        assert coordinator.predict_batch(texts) == expected
+        print("✅ Batch aggregated across shards in order")
+
+        # Variants of the same campaign land on the same worker and share its cache
+        assert coordinator.route(texts[0]) == coordinator.route(texts[1])
+        stats = coordinator.stats()[coordinator.route(texts[0])]
+        assert stats['cache_hits'] >= 1
+        print("✅ Routing follows normalized content")
+
+        # A dropped connection is retried; the worker stays on the ring
+        worker = coordinator.workers[coordinator.route(texts[0])]
+        worker.close_connection()
+        assert coordinator.predict_batch(texts) == expected
+        assert worker.name in coordinator.ring.nodes
+        assert worker.process.is_alive()
+        print("✅ Reconnected after dropped connection")
+
+        # Kill one worker; its messages fail over to the others
+        worker.process.terminate()
+        worker.process.join()
+        assert coordinator.predict_batch(texts) == expected
+        assert worker.name not in coordinator.ring.nodes
+        assert worker.name in coordinator.down
+        print("✅ Failed over after worker died")
+
+        # The probe respawns the dead worker and puts it back on the ring
+        coordinator.probe()
+        assert worker.name in coordinator.ring.nodes
+        assert worker.process.is_alive()
+        assert coordinator.predict_batch(texts) == expected
+        print("✅ Dead worker respawned and rejoined")
+
+    # A hung worker (stopped, but its socket still accepts connections)
+    # must not block requests or probes beyond the timeout
+    with ShardCoordinator(timeout=1, probe_interval=3600) as coordinator:
+        coordinator.spawn_local(3)
+        worker = coordinator.workers[coordinator.route(texts[0])]
+        os.kill(worker.process.pid, signal.SIGSTOP)
+        try:
+            durations = []
+
+            def classify():
+                start = time.monotonic()
+                assert coordinator.predict(texts[0]) == expected[0]
+                durations.append(time.monotonic() - start)
+
+            threads = [threading.Thread(target=classify) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=5)
+            assert len(durations) == 4 and max(durations) < 2
+            assert worker.name in coordinator.down
+
+            start = time.monotonic()
+            coordinator.probe()
+            assert time.monotonic() - start < 2
+            assert worker.name in coordinator.down
+        finally:
+            os.kill(worker.process.pid, signal.SIGCONT)
+
+        coordinator.probe()
+        assert worker.name in coordinator.ring.nodes
+        print("✅ Hung worker timed out and rejoined after resuming")
+
+def test_batch_endpoint():
+    """Test the batch classification endpoint"""
+    print("\n📦 Testing batch endpoint...")
+    print("=" * 50)
+
+    try:
+        import flask  # noqa: F401
+    except ImportError:
+        print("⚠️  flask not available. Install with: pip install -r requirements.txt")
+        if 'pytest' in sys.modules:
+            import pytest
+            pytest.skip("flask not installed")
+        return
+
+    import app
+
+    client = app.app.test_client()
+    texts = ["FREE MONEY! Click here NOW!", "Can we schedule a meeting?"]
+
+    response = client.post('/api/classify/batch', json={'texts': texts})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['text'] for r in results] == texts
+    assert [r['prediction'] for r in results] == ['spam', 'ham']
+
+    for body in ({}, [], {'texts': 'not a list'}, {'texts': ['ok', '']},
+                 {'texts': ['spam'] * (app.MAX_BATCH_SIZE + 1)}):
+        assert client.post('/api/classify/batch', json=body).status_code == 400
+    print("✅ Batch endpoint working")
+
 def test_api_endpoints():
     """Test the API endpoints"""
     print("\n🌐 Testing API endpoints...")
@@ -155,12 +301,22 @@ if __name__ == "__main__":
     
     # Test the classifier
     classifier_works = test_classifier()
+
+    # Test the sharded coordinator and batch endpoint
+    try:
+        test_hash_ring()
+        test_coordinator()
+        test_batch_endpoint()
+        coordinator_works = True
+    except AssertionError as e:
+        print(f"❌ Sharded tests failed: {e!r}")
+        coordinator_works = False
     
     # Test API endpoints
     test_api_endpoints()
     
     print("\n" + "=" * 50)
-    if classifier_works:
+    if classifier_works and coordinator_works:
         print("🎉 All tests completed successfully!")
     else:
         print("⚠️  Some tests failed. Please check the setup.")